@@ -1,13 +1,32 @@
+import hashlib
+import json
 import os
-from datetime import datetime, timezone
-from typing import Dict, List
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from statistics import median
+from typing import Dict, List, Tuple
 
 import requests
 import streamlit as st
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
-# Load .env locally (Streamlit Cloud will inject env vars via Secrets)
-load_dotenv()
+# Load .env locally (Streamlit Cloud will inject env vars via Secrets). Skipped,
+# import included, when there's no .env next to this file, since deployments
+# never ship one. Looked up beside app.py, not in the working directory, so
+# `streamlit run /path/to/app.py` from elsewhere still finds it.
+_DOTENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+if os.path.exists(_DOTENV_PATH):
+    from dotenv import load_dotenv
+
+    load_dotenv(_DOTENV_PATH)
 
 # ----------------- CONFIG ----------------- #
 
@@ -16,14 +35,22 @@ SITE_CONFIG = {
         "env_var": "WIW_ICS_URL_DUBLIN15",
         "label": "IE Dublin 15",
         "flag": "🇮🇪",
+        "ttl": 60,
     },
     "espoo": {
         "env_var": "WIW_ICS_URL_ESPOO",
         "label": "FI Espoo",
         "flag": "🇫🇮",
+        "ttl": 60,
     },
 }
 
+# A cached ICS body is fresh for the site's "ttl" seconds (ICS_TTL_SECONDS if unset).
+# Between that and ICS_MAX_STALE_SECONDS the stale copy is served immediately while
+# a background thread refetches it.
+ICS_TTL_SECONDS = 60
+ICS_MAX_STALE_SECONDS = 15 * 60
+
 # Optional: URL or identifier for OTNs feed (SharePoint, etc.)
 OTN_SOURCE = os.getenv("OTN_SHAREPOINT_URL", "")
 
@@ -31,207 +58,715 @@ OTN_SOURCE = os.getenv("OTN_SHAREPOINT_URL", "")
 # ----------------- ICS PARSING ----------------- #
 
 
+_UTC = timezone.utc
+
+
+@lru_cache(maxsize=4096)
 def parse_ics_datetime(dt_str: str) -> datetime:
-    """Parse strings like 20251201T080000Z into timezone-aware UTC datetimes."""
-    dt = datetime.strptime(dt_str, "%Y%m%dT%H%M%SZ")
-    return dt.replace(tzinfo=timezone.utc)
+    """
+    Parse strings like 20251201T080000Z into timezone-aware UTC datetimes.
+
+    Uses fromisoformat (Python 3.11+ reads the basic format), falling back to
+    strptime. Cached because feeds repeat the same shift boundaries a lot.
+    """
+    try:
+        dt = datetime.fromisoformat(dt_str)
+    except ValueError:
+        fmt = "%Y%m%d" if len(dt_str) == 8 else "%Y%m%dT%H%M%SZ"
+        dt = datetime.strptime(dt_str, fmt)
 
+    # Floating / DATE-only values carry no zone; treat them as UTC like the Z form
+    return dt if dt.tzinfo else dt.replace(tzinfo=_UTC)
 
-def parse_events_from_ics(ics_text: str) -> List[Dict]:
+
+# VEVENT bodies and the fields we care about. Works on raw bytes; values are
+# decoded only once they have matched.
+_VEVENT_RE = re.compile(rb"BEGIN:VEVENT\r?\n(.*?)END:VEVENT", re.DOTALL)
+# RFC 5545 folds lines longer than 75 octets as CRLF + one space or tab
+_FOLD_RE = re.compile(rb"\r?\n[ \t]")
+_FIELD_RE = re.compile(
+    rb"^[ \t]*(DTSTART|DTEND|SUMMARY|LOCATION):(.*?)[ \t\r]*$", re.MULTILINE
+)
+
+
+@dataclass(slots=True)
+class Events:
     """
-    Read BEGIN:VEVENT ... END:VEVENT blocks and extract
-    DTSTART, DTEND, SUMMARY, LOCATION.
+    Parsed VEVENTs in struct-of-arrays form: index i across the lists is one
+    event. Missing DTSTART/DTEND are None, missing SUMMARY/LOCATION are "".
     """
-    events: List[Dict] = []
-    current: Dict | None = None
-
-    for raw_line in ics_text.splitlines():
-        line = raw_line.strip()
-
-        if line == "BEGIN:VEVENT":
-            current = {}
-        elif line == "END:VEVENT":
-            if current:
-                events.append(current)
-            current = None
-        elif current is not None:
-            if line.startswith("DTSTART:"):
-                current["start"] = parse_ics_datetime(line[len("DTSTART:") :])
-            elif line.startswith("DTEND:"):
-                current["end"] = parse_ics_datetime(line[len("DTEND:") :])
-            elif line.startswith("SUMMARY:"):
-                current["summary"] = line[len("SUMMARY:") :]
-            elif line.startswith("LOCATION:"):
-                loc = line[len("LOCATION:") :]
-                current["location_raw"] = loc
 
-    return events
+    starts: List[datetime | None] = field(default_factory=list)
+    ends: List[datetime | None] = field(default_factory=list)
+    summaries: List[str] = field(default_factory=list)
+    locations: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.starts)
 
 
-def extract_name_and_role(summary: str) -> Dict[str, str]:
+def _ics_stamp(dt: datetime | None) -> bytes | None:
+    """dt as raw basic-format bytes, comparable against DTSTART/DTEND values."""
+    return dt.strftime("%Y%m%dT%H%M%SZ").encode("ascii") if dt else None
+
+
+def parse_events_from_ics(
+    ics_data: bytes,
+    ended_before: datetime | None = None,
+    starting_after: datetime | None = None,
+) -> Events:
     """
-    SUMMARY example:
-      'Stephen McSherry (Shift as Mission Control (MC) at MANNA HQ at Dublin 15 Operations Schedule)'
-    Returns: {"name": ..., "role": ...}
+    Read BEGIN:VEVENT ... END:VEVENT blocks and extract
+    DTSTART, DTEND, SUMMARY, LOCATION.
+
+    If ended_before / starting_after are given, events that finished before
+    the one or start after the other (or have no DTSTART/DTEND) are dropped.
+    The checks compare the raw YYYYMMDDTHHMMSSZ strings (which sort
+    chronologically), so skipped events never pay for datetime parsing.
     """
-    name = summary
-    role = "Unknown"
+    # Unfold first so long SUMMARY/LOCATION values aren't cut at the wrap.
+    # Skipped (no copy) for feeds that never fold.
+    if b"\n " in ics_data or b"\n\t" in ics_data:
+        ics_data = _FOLD_RE.sub(b"", ics_data)
 
-    if " (Shift as " in summary:
-        name_part, rest = summary.split(" (Shift as ", 1)
-        name = name_part.strip()
+    events = Events()
+    end_cutoff = _ics_stamp(ended_before)
+    start_cutoff = _ics_stamp(starting_after)
 
-        if " at " in rest:
-            role_part, _ = rest.split(" at ", 1)
-        else:
-            role_part = rest.rstrip(")")
+    for body in _VEVENT_RE.findall(ics_data):
+        # Each match is a (field, value) pair
+        raw: Dict[bytes, bytes] = dict(_FIELD_RE.findall(body))
 
-        role = role_part.strip()
+        if not raw:
+            continue
 
-    return {"name": name, "role": role}
+        dtstart = raw.get(b"DTSTART")
+        dtend = raw.get(b"DTEND")
 
+        if end_cutoff is not None or start_cutoff is not None:
+            if not dtstart or not dtend:
+                continue
+            if end_cutoff is not None and dtend < end_cutoff:
+                continue
+            if start_cutoff is not None and dtstart > start_cutoff:
+                continue
+
+        events.starts.append(parse_ics_datetime(dtstart.decode("ascii")) if dtstart else None)
+        events.ends.append(parse_ics_datetime(dtend.decode("ascii")) if dtend else None)
+        events.summaries.append(raw.get(b"SUMMARY", b"").decode("utf-8", "replace"))
+        events.locations.append(raw.get(b"LOCATION", b"").decode("utf-8", "replace"))
+
+    return events
 
+
+# Case-insensitive role matchers, so roles match whatever their casing.
+_MC_RE = re.compile(r"mission control|\(mc\)", re.I)
+_PILOT_RE = re.compile(r"flight operator|\(fo\)|pilot", re.I)
+_FLIGHT_OPERATOR_RE = re.compile(r"flight operator|\(fo\)", re.I)
+_LOADER_RE = re.compile(r"loader", re.I)
+_COLLECTOR_RE = re.compile(r"collector", re.I)
+
+
+@lru_cache(maxsize=4096)
 def classify_role_standard(role: str) -> str:
     """
     Buckets for the normal view: MC, Pilot, Other.
     """
-    r = role.lower()
-    if "mission control" in r or "(mc)" in r:
+    if _MC_RE.search(role):
         return "MC"
-    if "flight operator" in r or "(fo)" in r or "pilot" in r:
+    if _PILOT_RE.search(role):
         return "Pilot"
     return "Other"
 
 
+@lru_cache(maxsize=4096)
 def classify_role_mc_focus(role: str) -> str:
     """
     Buckets for the MC view: Flight Operator, Loader, Collector, Other.
     """
-    r = role.lower()
-    if "flight operator" in r or "(fo)" in r:
+    if _FLIGHT_OPERATOR_RE.search(role):
         return "Flight Operator"
-    if "loader" in r:
+    if _LOADER_RE.search(role):
         return "Loader"
-    if "collector" in r:
+    if _COLLECTOR_RE.search(role):
         return "Collector"
     return "Other"
 
 
+@lru_cache(maxsize=4096)
+def extract_and_classify(summary: str) -> Tuple[str, str, str]:
+    """
+    SUMMARY example:
+      'Stephen McSherry (Shift as Mission Control (MC) at MANNA HQ at Dublin 15 Operations Schedule)'
+    Split it into name and role and bucket the role for the standard view.
+    Returns: (name, role, bucket)
+
+    Cached (as are the classifiers): a feed repeats the same person/role
+    summary across many shifts, so most calls are a dict hit.
+    """
+    # Name before " (Shift as ", role up to the first " at "
+    name_part, sep, rest = summary.partition(" (Shift as ")
+    if not sep:
+        return summary, "Unknown", "Other"
+
+    role_part, sep, _ = rest.partition(" at ")
+    if not sep:
+        role_part = rest.rstrip(")")
+
+    role = role_part.strip()
+    return name_part.strip(), role, classify_role_standard(role)
+
+
+@dataclass(slots=True)
+class Shifts:
+    """
+    One feed's shifts, already split into name/role and bucketed for both
+    the standard view (buckets) and the MC view (mc_buckets). Struct-of-arrays
+    like Events: index i is one shift. Sorted by start; start_ts/end_ts are
+    epoch seconds for cheap bisecting. No start/end datetimes are kept:
+    filtering uses the epoch columns and rendering uses end_labels.
+    """
+
+    start_ts: List[int] = field(default_factory=list)
+    end_ts: List[int] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    roles: List[str] = field(default_factory=list)
+    buckets: List[str] = field(default_factory=list)
+    mc_buckets: List[str] = field(default_factory=list)
+    search_keys: List[str] = field(default_factory=list)
+    end_labels: List[str] = field(default_factory=list)
+
+
+# Shifts starting more than PARSE_HORIZON after parse time are skipped. The
+# parsed result lives for half that, so anything skipped can't have started
+# yet by the time the cache entry expires and the body is parsed again.
+PARSE_HORIZON = timedelta(hours=24)
+
+
+@st.cache_data(max_entries=16, ttl=PARSE_HORIZON / 2, show_spinner=False)
+def parse_site_shifts(ics_data: bytes) -> Shifts:
+    """
+    Parse and classify an ICS body once per distinct content (Streamlit keys
+    the cache on the bytes), so an unchanged feed costs nothing to re-use.
+    Only the time-window check in filter_active_shifts depends on "now".
+
+    Events that have already ended are dropped up front (time only moves
+    forward, so they can never become active again), as are events beyond
+    PARSE_HORIZON.
+    """
+    t0 = time.perf_counter_ns()
+    parsed_at = datetime.now(timezone.utc)
+    events = parse_events_from_ics(
+        ics_data,
+        ended_before=parsed_at,
+        starting_after=parsed_at + PARSE_HORIZON,
+    )
+    shifts = Shifts()
+
+    rows = sorted(zip(events.starts, events.ends, events.summaries), key=itemgetter(0))
+    for start, end, summary in rows:
+        name, role, bucket = extract_and_classify(summary)
+        shifts.start_ts.append(int(start.timestamp()))
+        shifts.end_ts.append(int(end.timestamp()))
+        shifts.names.append(name)
+        shifts.roles.append(role)
+        shifts.buckets.append(bucket)
+        shifts.mc_buckets.append(classify_role_mc_focus(role))
+        # Tab-separated so a search can't match across the name/role boundary
+        shifts.search_keys.append(f"{name}\t{role}".casefold())
+        # "On until HH:MM" label, formatted here so rendering does no datetime work
+        shifts.end_labels.append(format_end_time_local(end))
+
+    record_parse(time.perf_counter_ns() - t0)
+    return shifts
+
+
 # ----------------- DATA FETCHING ----------------- #
 
+@dataclass(frozen=True, slots=True)
+class Person:
+    """Someone currently on shift, as passed to the filters and renderers."""
+
+    name: str
+    role: str
+    end_label: str
+    # MC-view bucket, classified at parse time so regrouping is a plain lookup
+    mc_bucket: str
+    # Casefolded "name<TAB>role", built at parse time so search never re-lowercases
+    search_key: str
+
+
+# Sort key: search_key orders people case-insensitively by name (role breaks ties).
+_BY_NAME = attrgetter("search_key")
+
 
-def load_active_sites() -> Dict[str, Dict]:
-    """Return only sites that have an ICS URL configured."""
-    active: Dict[str, Dict] = {}
+@dataclass(frozen=True, slots=True)
+class Site:
+    """A configured site with its ICS URL resolved. Immutable after import."""
+
+    id: str
+    label: str
+    flag: str
+    url: str
+    ttl: int
+    # "🇮🇪 IE Dublin 15": dropdown label and section heading, built once
+    display_name: str
+
+
+# No spinner: this runs at import, before st.set_page_config, which must be
+# the first element sent on the page
+@st.cache_resource(show_spinner=False)
+def load_active_sites() -> Dict[str, Site]:
+    """
+    Return only sites that have an ICS URL configured. Resolved once per
+    process and shared across sessions, like the HTTP session.
+    """
+    active: Dict[str, Site] = {}
     for site_id, cfg in SITE_CONFIG.items():
         url = os.getenv(cfg["env_var"])
         if url:
-            active[site_id] = {**cfg, "url": url}
+            active[site_id] = Site(
+                id=site_id,
+                label=cfg["label"],
+                flag=cfg["flag"],
+                url=url,
+                ttl=cfg.get("ttl", ICS_TTL_SECONDS),
+                display_name=f"{cfg['flag']} {cfg['label']}",
+            )
     return active
 
 
 ACTIVE_SITES = load_active_sites()
 
+# Dropdown labels and their reverse lookup. Module-level, so rebuilt on each
+# full-page rerun, but not on render_dashboard's fragment reruns.
+SITE_LABELS: Dict[str, str] = {
+    site_id: site.display_name for site_id, site in ACTIVE_SITES.items()
+}
+LABEL_TO_SITE_ID: Dict[str, str] = {label: site_id for site_id, label in SITE_LABELS.items()}
+
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """One shared session so TCP/TLS connections are pooled across sites and reruns."""
+    session = requests.Session()
+    # requests already asks for gzip/deflate, which shrinks ICS text a lot
+    session.headers["Accept"] = "text/calendar"
+    # Room for one kept-alive connection per concurrently fetched site
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, len(SITE_CONFIG)))
+    session.mount("https://", adapter)
+    return session
+
+
+# Last good ICS body per site is also kept on disk so restarts don't cold-start
+ICS_DISK_CACHE_DIR = os.getenv("WIW_ICS_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "wiw"
+)
+
+
+@st.cache_resource
+def get_ics_store() -> Dict:
+    """
+    Process-wide ICS cache plus refresh bookkeeping.
+
+    entries: {site_id: {"body", "fetched_at", "etag", "last_modified"}}
+    failures: {site_id: (failed_at, error)} for the last blocking fetch that failed
+    """
+    return {"entries": {}, "refreshing": set(), "failures": {}, "lock": threading.Lock()}
+
+
+@st.cache_resource
+def get_perf_stats() -> Dict:
+    """
+    Process-wide counters for the sidebar "Perf" panel.
+
+    Kept in a cache_resource rather than st.session_state because fetches run
+    on worker threads, which have no session.
+    """
+    return {
+        "fresh_hits": 0,
+        "stale_hits": 0,
+        "misses": 0,
+        "fetch_ns": 0,
+        "parses": 0,
+        # Recent parse durations only, for the median
+        "parse_ns": deque(maxlen=100),
+        "lock": threading.Lock(),
+    }
+
+
+def record_fetch(outcome: str, elapsed_ns: int = 0):
+    """Count one fetch_ics call; outcome is "fresh_hits", "stale_hits" or "misses"."""
+    stats = get_perf_stats()
+    with stats["lock"]:
+        stats[outcome] += 1
+        stats["fetch_ns"] += elapsed_ns
+
+
+def record_parse(elapsed_ns: int):
+    stats = get_perf_stats()
+    with stats["lock"]:
+        stats["parses"] += 1
+        stats["parse_ns"].append(elapsed_ns)
+
+
+def download_ics(site_id: str, previous: Dict | None = None) -> Dict:
+    """
+    GET a site's ICS feed and return a fresh cache entry.
+
+    If we already hold a copy, send its validators as a conditional GET; a
+    304 Not Modified reuses the cached body without downloading it again.
+    """
+    url = ACTIVE_SITES[site_id].url
+
+    headers: Dict[str, str] = {}
+    if previous:
+        if previous["etag"]:
+            headers["If-None-Match"] = previous["etag"]
+        if previous["last_modified"]:
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    resp = get_http_session().get(url, headers=headers, timeout=15)
+
+    if resp.status_code == 304 and previous:
+        return {
+            "body": previous["body"],
+            "fetched_at": time.monotonic(),
+            "etag": resp.headers.get("ETag") or previous["etag"],
+            "last_modified": resp.headers.get("Last-Modified") or previous["last_modified"],
+        }
 
-@st.cache_data(ttl=60)
-def fetch_ics(site_id: str) -> str:
-    cfg = ACTIVE_SITES[site_id]
-    url = cfg["url"]
-    resp = requests.get(url, timeout=15)
     resp.raise_for_status()
-    return resp.text
+    return {
+        "body": resp.content,
+        "fetched_at": time.monotonic(),
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def _disk_cache_path(site_id: str) -> str:
+    # Keyed on the feed URL too, so rotating a WIW_ICS_URL_* never serves the old feed
+    url_hash = hashlib.sha256(ACTIVE_SITES[site_id].url.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(ICS_DISK_CACHE_DIR, f"{site_id}-{url_hash}.ics")
+
+
+def _validators_path(site_id: str) -> str:
+    return _disk_cache_path(site_id) + ".json"
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_ics_from_disk(site_id: str) -> Dict | None:
+    """
+    Rebuild a cache entry from the on-disk copy, so a restarted worker does
+    not cold-start. Its age comes from the file mtime, so the normal
+    fresh / stale / expired rules still apply; the saved ETag/Last-Modified
+    let the first refresh after a restart still be a conditional GET.
+
+    The sidecar records the URL the copy came from. If it doesn't match the
+    site's current URL (or is missing), the copy is ignored, so old
+    validators are never sent to a different feed.
+    """
+    path = _disk_cache_path(site_id)
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            body = f.read()
+    except OSError:
+        return None
+
+    try:
+        with open(_validators_path(site_id), "rb") as f:
+            validators = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if validators.get("url") != ACTIVE_SITES[site_id].url:
+        return None
+
+    age = max(0.0, time.time() - mtime)
+    return {
+        "body": body,
+        "fetched_at": time.monotonic() - age,
+        "etag": validators.get("etag"),
+        "last_modified": validators.get("last_modified"),
+    }
+
+
+def save_ics_to_disk(site_id: str, entry: Dict, changed: bool = True):
+    """Best-effort write (atomic via os.replace); unchanged bodies just get their mtime bumped."""
+    path = _disk_cache_path(site_id)
+    validators = {
+        "url": ACTIVE_SITES[site_id].url,
+        "etag": entry["etag"],
+        "last_modified": entry["last_modified"],
+    }
+    try:
+        os.makedirs(ICS_DISK_CACHE_DIR, exist_ok=True)
+        _atomic_write(_validators_path(site_id), json.dumps(validators).encode("utf-8"))
+        if not changed and os.path.exists(path):
+            os.utime(path)
+        else:
+            _atomic_write(path, entry["body"])
+    except OSError:
+        pass
+
+
+def _store_ics(store: Dict, site_id: str, entry: Dict):
+    with store["lock"]:
+        previous = store["entries"].get(site_id)
+        store["entries"][site_id] = entry
+
+    changed = previous is None or previous["body"] is not entry["body"]
+    save_ics_to_disk(site_id, entry, changed)
+
+
+def _refresh_ics_in_background(store: Dict, site_id: str, previous: Dict):
+    try:
+        _store_ics(store, site_id, download_ics(site_id, previous))
+    except requests.RequestException:
+        # Keep serving the stale copy; the next access will try again.
+        pass
+    finally:
+        with store["lock"]:
+            store["refreshing"].discard(site_id)
 
 
-def get_active_shifts(now_utc: datetime) -> Dict[str, Dict]:
+def fetch_ics(site_id: str) -> bytes:
+    """
+    Return the raw ICS body for a site (stale-while-revalidate).
+
+    Fresh entries are returned as-is. Stale entries are returned immediately
+    and refreshed on a daemon thread (at most one in flight per site). Only a
+    missing or very old entry blocks on the network; if that download fails,
+    the error is re-raised without retrying until the site's ttl has passed,
+    so a dead feed doesn't stall every rerun on the request timeout.
+    """
+    store = get_ics_store()
+
+    with store["lock"]:
+        entry = store["entries"].get(site_id)
+        if entry is None:
+            entry = load_ics_from_disk(site_id)
+            if entry:
+                store["entries"][site_id] = entry
+        if entry:
+            age = time.monotonic() - entry["fetched_at"]
+            if age < ACTIVE_SITES[site_id].ttl:
+                record_fetch("fresh_hits")
+                return entry["body"]
+            if age < ICS_MAX_STALE_SECONDS:
+                if site_id not in store["refreshing"]:
+                    store["refreshing"].add(site_id)
+                    threading.Thread(
+                        target=_refresh_ics_in_background,
+                        args=(store, site_id, entry),
+                        daemon=True,
+                    ).start()
+                record_fetch("stale_hits")
+                return entry["body"]
+
+        failure = store["failures"].get(site_id)
+        if failure and time.monotonic() - failure[0] < ACTIVE_SITES[site_id].ttl:
+            raise failure[1]
+
+    t0 = time.perf_counter_ns()
+    try:
+        fresh = download_ics(site_id, entry)
+    except requests.RequestException as e:
+        with store["lock"]:
+            store["failures"][site_id] = (time.monotonic(), e)
+        raise
+    with store["lock"]:
+        store["failures"].pop(site_id, None)
+    _store_ics(store, site_id, fresh)
+    record_fetch("misses", time.perf_counter_ns() - t0)
+    return fresh["body"]
+
+
+def fetch_all_ics() -> Tuple[Dict[str, bytes], Dict[str, Exception]]:
+    """
+    Fetch every active site's ICS body in one fan-out.
+
+    Each site runs on its own worker thread over the shared pooled session,
+    so a cold load waits for the slowest feed rather than the sum of them.
+    Returns ({site_id: body} in the configured site order, {site_id: error})
+    so one dead feed doesn't stop the others from loading.
+    """
+    bodies: Dict[str, bytes] = {}
+    errors: Dict[str, Exception] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, len(ACTIVE_SITES))) as ex:
+        futures = {ex.submit(fetch_ics, site_id): site_id for site_id in ACTIVE_SITES}
+        for future in as_completed(futures):
+            site_id = futures[future]
+            try:
+                bodies[site_id] = future.result()
+            except requests.RequestException as e:
+                errors[site_id] = e
+
+    ordered = {site_id: bodies[site_id] for site_id in ACTIVE_SITES if site_id in bodies}
+    return ordered, errors
+
+
+def clear_ics_cache():
+    """Drop all cached ICS bodies (memory and disk) so the next fetch goes to the network."""
+    store = get_ics_store()
+    with store["lock"]:
+        store["entries"].clear()
+        store["failures"].clear()
+
+    for site_id in ACTIVE_SITES:
+        for path in (_disk_cache_path(site_id), _validators_path(site_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class PartialShifts(Exception):
+    """
+    Raised out of _compute_active_shifts when some sites failed, so
+    st.cache_data doesn't keep the partial result for the whole minute.
+    Carries the sites that did load and the per-site errors.
+    """
+
+    def __init__(self, results: Dict[str, Dict], errors: Dict[str, Exception]):
+        super().__init__(f"{len(errors)} site(s) failed to load")
+        self.results = results
+        self.errors = errors
+
+
+def get_active_shifts(now_utc: datetime) -> Tuple[Dict[str, Dict], Dict[str, Exception]]:
     """
     Group active shifts by site and role for the *standard* view.
 
-    Returns:
+    Returns (sites, errors), where errors maps site_id to the exception that
+    stopped that site's feed from being fetched or parsed, and sites is:
     {
       "dublin15": {
-         "meta": {label, flag, ...},
-         "roles": {"MC": [...], "Pilot": [...], "Other": [...]}
+         "meta": Site(id, label, flag, url, ttl, display_name),
+         "roles": {"MC": [...], "Pilot": [...], "Other": [...]},
+         "mc_roles": {"Flight Operator": [...], "Loader": [...], ...}
       },
       ...
     }
+
+    The result is cached per minute, so widget-driven reruns (search typing,
+    site picker) skip fetching, parsing and bucketing entirely. The MC-view
+    grouping is built here too, so it is not redone on every render.
+
+    Only complete results are cached: with a failed site the build is redone
+    on each rerun, which stays cheap because the other sites are served from
+    the ICS store and parse cache, and fetch_ics only retries the failed feed
+    once its ttl has passed. If every site fails, the first error is raised.
     """
-    results: Dict[str, Dict] = {}
+    try:
+        return _compute_active_shifts(int(now_utc.timestamp()) // 60), {}
+    except PartialShifts as partial:
+        if not partial.results:
+            raise next(iter(partial.errors.values()))
+        return partial.results, partial.errors
 
-    for site_id, meta in ACTIVE_SITES.items():
-        ics_text = fetch_ics(site_id)
-        events = parse_events_from_ics(ics_text)
 
-        roles: Dict[str, List[Dict]] = {"MC": [], "Pilot": [], "Other": []}
+@st.cache_data(ttl=60, show_spinner=False)
+def _compute_active_shifts(now_bucket: int) -> Dict[str, Dict]:
+    """Build both views' structures for the start of a one-minute bucket."""
+    now_utc = datetime.fromtimestamp(now_bucket * 60, tz=timezone.utc)
+    results: Dict[str, Dict] = {}
+    bodies, errors = fetch_all_ics()
+
+    for site_id, ics_data in bodies.items():
+        try:
+            roles = filter_active_shifts(parse_site_shifts(ics_data), now_utc)
+        except Exception as e:
+            # A feed that downloads but won't parse only takes out its own site
+            errors[site_id] = e
+            continue
+        results[site_id] = {
+            "meta": ACTIVE_SITES[site_id],
+            "roles": roles,
+            "mc_roles": group_for_mc_view(roles),
+        }
 
-        for ev in events:
-            start = ev.get("start")
-            end = ev.get("end")
-            summary = ev.get("summary", "")
+    if errors:
+        raise PartialShifts(results, errors)
+    return results
 
-            if not start or not end:
-                continue
 
-            # Only keep shifts active right now (in UTC)
-            if not (start <= now_utc <= end):
-                continue
+def filter_active_shifts(shifts: Shifts, now_utc: datetime) -> Dict[str, List[Person]]:
+    """Pick the shifts active at now_utc and group them into MC / Pilot / Other."""
+    roles: Dict[str, List[Person]] = {"MC": [], "Pilot": [], "Other": []}
+    now_ts = now_utc.timestamp()
 
-            info = extract_name_and_role(summary)
-            bucket = classify_role_standard(info["role"])
+    # Shifts are sorted by start, so everything from `stop` on hasn't begun yet
+    stop = bisect_right(shifts.start_ts, now_ts)
 
-            roles[bucket].append(
-                {
-                    "name": info["name"],
-                    "role": info["role"],
-                    "start": start,
-                    "end": end,
-                }
-            )
+    for i in range(stop):
+        # Only keep shifts active right now (in UTC)
+        if shifts.end_ts[i] < now_ts:
+            continue
 
-        # Sort by name for neatness
-        for key in roles:
-            roles[key].sort(key=lambda x: x["name"])
+        roles[shifts.buckets[i]].append(
+            Person(
+                name=shifts.names[i],
+                role=shifts.roles[i],
+                end_label=shifts.end_labels[i],
+                mc_bucket=shifts.mc_buckets[i],
+                search_key=shifts.search_keys[i],
+            )
+        )
 
-        results[site_id] = {"meta": meta, "roles": roles}
+    # Sort by name for neatness
+    for key in roles:
+        roles[key].sort(key=_BY_NAME)
 
-    return results
+    return roles
 
 
-def regroup_for_mc_view(all_sites: Dict[str, Dict]) -> Dict[str, Dict]:
+def group_for_mc_view(std_roles: Dict[str, List[Person]]) -> Dict[str, List[Person]]:
     """
-    Take the standard-view structure and regroup everyone into
-    Flight Operator / Loader / Collector / Other buckets for each site.
+    Regroup one site's standard-view buckets into
+    Flight Operator / Loader / Collector / Other (by each person's mc_bucket).
     """
-    mc_results: Dict[str, Dict] = {}
+    # Flatten all people in this site
+    everyone: List[Person] = (
+        std_roles.get("MC", [])
+        + std_roles.get("Pilot", [])
+        + std_roles.get("Other", [])
+    )
 
-    for site_id, site_data in all_sites.items():
-        meta = site_data["meta"]
-        std_roles = site_data["roles"]
-
-        # Flatten all people in this site
-        everyone: List[Dict] = (
-            std_roles.get("MC", [])
-            + std_roles.get("Pilot", [])
-            + std_roles.get("Other", [])
-        )
+    buckets: Dict[str, List[Person]] = {
+        "Flight Operator": [],
+        "Loader": [],
+        "Collector": [],
+        "Other": [],
+    }
 
-        buckets: Dict[str, List[Dict]] = {
-            "Flight Operator": [],
-            "Loader": [],
-            "Collector": [],
-            "Other": [],
-        }
+    for p in everyone:
+        buckets[p.mc_bucket].append(p)
 
-        for p in everyone:
-            bucket = classify_role_mc_focus(p["role"])
-            buckets[bucket].append(p)
+    # Sort by name
+    for k in buckets:
+        buckets[k].sort(key=_BY_NAME)
 
-        # Sort by name
-        for k in buckets:
-            buckets[k].sort(key=lambda x: x["name"])
+    return buckets
 
-        mc_results[site_id] = {"meta": meta, "roles": buckets}
 
-    return mc_results
+def regroup_for_mc_view(all_sites: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Take the standard-view structure and swap in each site's precomputed
+    Flight Operator / Loader / Collector / Other buckets.
+    """
+    return {
+        site_id: {"meta": site_data["meta"], "roles": site_data["mc_roles"]}
+        for site_id, site_data in all_sites.items()
+    }
 
 
 # ----------------- OTN (SharePoint / env) ----------------- #
@@ -310,19 +845,19 @@ def render_otn_cards():
 # ----------------- UI HELPERS ----------------- #
 
 
+@lru_cache(maxsize=256)
 def format_end_time_local(end_utc: datetime) -> str:
-    """Return local time as HH:MM (24h)."""
+    """
+    Return local time as HH:MM (24h). Only called while parsing a feed; the
+    labels then live in the st.cache_data parse result. The lru_cache just
+    dedupes the many shifts in one feed that end at the same time.
+    """
     local_dt = end_utc.astimezone()
     return local_dt.strftime("%H:%M")
 
 
-def render_person_card(person: Dict):
-    """Small white card for a single person."""
-    name = person["name"]
-    role = person["role"]
-    end_label = format_end_time_local(person["end"])
-
-    card_html = f"""
+# Person card markup, built once at import; person_card_html fills the {slots}.
+_PERSON_CARD_TMPL = """
     <div style="
         padding:0.55rem 0.8rem;
         border-radius:0.6rem;
@@ -337,66 +872,129 @@ def render_person_card(person: Dict):
       </div>
     </div>
     """
-    st.markdown(card_html, unsafe_allow_html=True)
 
 
-def render_role_column(title: str, colour: str, people: List[Dict], is_other: bool = False):
+# The template pre-split around its slots; each card joins these fragments with
+# the person's values.
+# Outer whitespace is stripped so joined cards never leave a blank line, which
+# would end Markdown's raw HTML block mid-column.
+_CARD_HEAD, _, _card_rest = _PERSON_CARD_TMPL.strip().partition("{name}")
+_CARD_NAME_TO_ROLE, _, _card_rest = _card_rest.partition("{role}")
+_CARD_ROLE_TO_END, _, _CARD_TAIL = _card_rest.partition("{end_label}")
+
+
+def person_card_html(person: Person) -> str:
+    """HTML for the small white card for a single person."""
+    return "".join(
+        (
+            _CARD_HEAD,
+            person.name,
+            _CARD_NAME_TO_ROLE,
+            person.role,
+            _CARD_ROLE_TO_END,
+            person.end_label,
+            _CARD_TAIL,
+        )
+    )
+
+
+def count_badges_html(badges: List[Tuple[str, str]]) -> str:
     """
-    Render a role column (header + list of people), or an 'Other roles' expander.
-    colour = background colour of the header bar.
+    One flex row of small "● label" counts, given (colour, text) pairs.
+    Replaces an st.columns row with a markdown call per badge.
     """
-    header_html = f"""
-    <div style="
-        padding:0.35rem 0.75rem;
-        border-radius:0.6rem;
-        background-color:{colour};
-        font-weight:600;
-        font-size:0.9rem;
-        color:#111827;
-        margin-bottom:0.3rem;
-    ">
-      {title}
-    </div>
+    cells = "".join(
+        f"<div style='flex:1; font-size:0.8rem; color:{colour};'>● {text}</div>"
+        for colour, text in badges
+    )
+    return f"<div style='display:flex; gap:1rem;'>{cells}</div>"
+
+
+_NONE_ON_SHIFT_HTML = (
+    "<div style='font-size:0.85rem; color:#6b7280; margin-top:0.35rem;'>None on shift</div>"
+)
+
+
+def role_header_html(title: str, colour: str) -> str:
+    """Coloured header bar at the top of a role column."""
+    return (
+        "<div style='padding:0.35rem 0.75rem; border-radius:0.6rem; "
+        f"background-color:{colour}; font-weight:600; font-size:0.9rem; "
+        f"color:#111827; margin-bottom:0.3rem;'>{title}</div>"
+    )
+
+
+def role_column_html(title: str, colour: str, people: List[Person], is_other: bool = False) -> str:
     """
+    HTML for a role column (header + list of people), or an 'Other roles'
+    disclosure. colour = background colour of the header bar.
+    """
+    body = role_header_html(title, colour) + (
+        "".join(map(person_card_html, people)) if people else _NONE_ON_SHIFT_HTML
+    )
 
     if is_other:
-        count = len(people)
-        with st.expander(f"Other roles ({count})", expanded=False):
-            st.markdown(header_html, unsafe_allow_html=True)
-            if not people:
-                st.caption("None on shift")
-            else:
-                for p in people:
-                    render_person_card(p)
-    else:
-        st.markdown(header_html, unsafe_allow_html=True)
-        if not people:
-            st.caption("None on shift")
-        else:
-            for p in people:
-                render_person_card(p)
+        # Native <details> instead of st.expander: opening it needs no rerun
+        return (
+            "<details class='wiw-other'>"
+            f"<summary>Other roles ({len(people)})</summary>{body}</details>"
+        )
+    return body
+
+
+def render_site_section(meta: Site, badges: List[Tuple[str, str]], columns: List[str]):
+    """
+    Emit a whole site block (heading, counts, the three role columns and
+    the closing rule) as one st.markdown call.
+
+    The HTML has no blank lines, so Markdown treats it as a single raw
+    block; the columns sit in a CSS grid (.wiw-grid, styled in main).
+    """
+    cells = "".join(f"<div>{col}</div>" for col in columns)
+    st.markdown(
+        f"### {meta.display_name}\n\n"
+        f"{count_badges_html(badges)}<div class='wiw-grid'>{cells}</div>\n\n---",
+        unsafe_allow_html=True,
+    )
+
+
+def _iter_people(all_sites: Dict[str, Dict]):
+    for site_data in all_sites.values():
+        for people in site_data["roles"].values():
+            yield from people
+
+
+# Queries shorter than this match nearly everyone, so they don't filter at all
+MIN_SEARCH_CHARS = 2
 
 
 def apply_search_filter(all_sites: Dict[str, Dict], search_text: str) -> Dict[str, Dict]:
     """Filter people by name/role across all sites."""
-    if not search_text:
+    search = search_text.casefold().strip()
+    if len(search) < MIN_SEARCH_CHARS:
         return all_sites
 
-    search = search_text.lower().strip()
+    # Cheap early exit: a query that matches nobody needs no rebuilt structure
+    if not any(search in p.search_key for p in _iter_people(all_sites)):
+        return {}
+
     filtered: Dict[str, Dict] = {}
 
     for site_id, site_data in all_sites.items():
-        roles = site_data["roles"]
-        new_roles: Dict[str, List[Dict]] = {}
-        for bucket, people in roles.items():
-            new_roles[bucket] = [
-                p
-                for p in people
-                if search in p["name"].lower() or search in p["role"].lower()
-            ]
+        new_roles = {
+            bucket: [p for p in people if search in p.search_key]
+            for bucket, people in site_data["roles"].items()
+        }
         # Only keep site if at least one person matches
-        if any(new_roles[b] for b in new_roles):
-            filtered[site_id] = {"meta": site_data["meta"], "roles": new_roles}
+        if any(new_roles.values()):
+            filtered[site_id] = {
+                "meta": site_data["meta"],
+                "roles": new_roles,
+                "mc_roles": {
+                    bucket: [p for p in people if search in p.search_key]
+                    for bucket, people in site_data["mc_roles"].items()
+                },
+            }
 
     return filtered
 
@@ -409,47 +1007,24 @@ def render_standard_site_section(site_id: str, site_data: Dict):
     meta = site_data["meta"]
     roles = site_data["roles"]
 
-    flag = meta["flag"]
-    label = meta["label"]
-
     mc_count = len(roles["MC"])
     pilot_count = len(roles["Pilot"])
     other_count = len(roles["Other"])
 
-    st.markdown(f"### {flag} {label}")
-
-    # Tiny counts above the columns
-    col_mc, col_pilot, col_other = st.columns(3)
-    with col_mc:
-        st.markdown(
-            f"<div style='font-size:0.8rem; color:#059669;'>● MC: {mc_count}</div>",
-            unsafe_allow_html=True,
-        )
-    with col_pilot:
-        st.markdown(
-            f"<div style='font-size:0.8rem; color:#2563eb;'>● Pilot: {pilot_count}</div>",
-            unsafe_allow_html=True,
-        )
-    with col_other:
-        st.markdown(
-            f"<div style='font-size:0.8rem; color:#6b21a8;'>● Other: {other_count}</div>",
-            unsafe_allow_html=True,
-        )
-
-    st.markdown("")
-
-    col1, col2, col3 = st.columns([1, 1, 1.1])
-
-    with col1:
-        render_role_column(f"MC ({mc_count})", "#e9f7ef", roles["MC"], is_other=False)
-
-    with col2:
-        render_role_column(f"Pilot ({pilot_count})", "#e5f0ff", roles["Pilot"], is_other=False)
-
-    with col3:
-        render_role_column("Other roles", "#f4e9ff", roles["Other"], is_other=True)
-
-    st.markdown("---")
+    # Tiny counts above the columns, then MC / Pilot / Other
+    render_site_section(
+        meta,
+        [
+            ("#059669", f"MC: {mc_count}"),
+            ("#2563eb", f"Pilot: {pilot_count}"),
+            ("#6b21a8", f"Other: {other_count}"),
+        ],
+        [
+            role_column_html(f"MC ({mc_count})", "#e9f7ef", roles["MC"]),
+            role_column_html(f"Pilot ({pilot_count})", "#e5f0ff", roles["Pilot"]),
+            role_column_html("Other roles", "#f4e9ff", roles["Other"], is_other=True),
+        ],
+    )
 
 
 def render_mc_site_section(site_id: str, site_data: Dict):
@@ -467,95 +1042,95 @@ def render_mc_site_section(site_id: str, site_data: Dict):
     meta = site_data["meta"]
     roles = site_data["roles"]
 
-    flag = meta["flag"]
-    label = meta["label"]
-
     fo_count = len(roles["Flight Operator"])
     loader_count = len(roles["Loader"])
     collector_count = len(roles["Collector"])
     other_count = len(roles["Other"])
 
     # Custom sort helpers for loaders & collectors
-    def loader_sort_key(p: Dict):
-        r = p["role"].lower()
+    def loader_sort_key(p: Person):
+        r = p.role.lower()
         if "bt loader" in r:
             priority = 0
         elif "cm loader" in r:
             priority = 1
         else:
             priority = 2
-        return (priority, p["name"])
+        return (priority, p.name)
 
-    def collector_sort_key(p: Dict):
-        r = p["role"].lower()
+    def collector_sort_key(p: Person):
+        r = p.role.lower()
         if "bt collector" in r:
             priority = 0
         elif "cm collector" in r:
             priority = 1
         else:
             priority = 2
-        return (priority, p["name"])
+        return (priority, p.name)
 
     sorted_loaders = sorted(roles["Loader"], key=loader_sort_key)
     sorted_collectors = sorted(roles["Collector"], key=collector_sort_key)
 
-    st.markdown(f"### {flag} {label}")
-
-    col_fo, col_loader, col_collector = st.columns(3)
-    with col_fo:
-        st.markdown(
-            f"<div style='font-size:0.8rem; color:#2563eb;'>● Flight operators: {fo_count}</div>",
-            unsafe_allow_html=True,
-        )
-    with col_loader:
-        st.markdown(
-            f"<div style='font-size:0.8rem; color:#16a34a;'>● Loaders: {loader_count}</div>",
-            unsafe_allow_html=True,
-        )
-    with col_collector:
-        st.markdown(
-            f"<div style='font-size:0.8rem; color:#a855f7;'>● Collectors: {collector_count}</div>",
-            unsafe_allow_html=True,
+    collectors_html = role_column_html(
+        f"Collectors ({collector_count})", "#fef3c7", sorted_collectors
+    )
+    if other_count:
+        collectors_html += "<div style='margin-top:1rem;'></div>" + role_column_html(
+            "Other roles", "#f4e9ff", roles["Other"], is_other=True
         )
 
-    st.markdown("")
+    render_site_section(
+        meta,
+        [
+            ("#2563eb", f"Flight operators: {fo_count}"),
+            ("#16a34a", f"Loaders: {loader_count}"),
+            ("#a855f7", f"Collectors: {collector_count}"),
+        ],
+        [
+            role_column_html(
+                f"Flight operators ({fo_count})", "#e5f0ff", roles["Flight Operator"]
+            ),
+            role_column_html(f"Loaders ({loader_count})", "#e9f7ef", sorted_loaders),
+            collectors_html,
+        ],
+    )
 
-    col1, col2, col3 = st.columns([1, 1, 1.1])
 
-    with col1:
-        render_role_column(
-            f"Flight operators ({fo_count})",
-            "#e5f0ff",
-            roles["Flight Operator"],
-            is_other=False,
-        )
-
-    with col2:
-        render_role_column(
-            f"Loaders ({loader_count})",
-            "#e9f7ef",
-            sorted_loaders,
-            is_other=False,
-        )
+def render_perf_panel():
+    """
+    Sidebar debug panel: ICS cache hit/miss counts and parse timings.
 
-    with col3:
-        render_role_column(
-            f"Collectors ({collector_count})",
-            "#fef3c7",
-            sorted_collectors,
-            is_other=False,
-        )
+    Rendered from main, not render_dashboard: a fragment can't write to the
+    sidebar, so the panel only updates on full-page reruns, not when the
+    dashboard fragment reruns on its own.
+    """
+    stats = get_perf_stats()
+    with stats["lock"]:
+        misses = stats["misses"]
+        parse_ns = list(stats["parse_ns"])
+        summary = {
+            "fresh_hits": stats["fresh_hits"],
+            "stale_hits": stats["stale_hits"],
+            "misses": misses,
+            "parses": stats["parses"],
+            "avg_fetch_ms": round(stats["fetch_ns"] / misses / 1e6, 1) if misses else None,
+        }
 
-        if other_count:
-            st.markdown("")
-            render_role_column("Other roles", "#f4e9ff", roles["Other"], is_other=True)
+    summary["p50_parse_ms"] = round(median(parse_ns) / 1e6, 2) if parse_ns else None
 
-    st.markdown("---")
+    with st.sidebar.expander("Perf", expanded=False):
+        st.write(summary)
 
 
 # ----------------- MAIN APP ----------------- #
 
 
+def clear_all_caches():
+    """Everything the "Refresh now" button should throw away."""
+    st.cache_data.clear()
+    clear_ics_cache()
+
+
 def main():
     st.set_page_config(page_title="Who’s on shift?", layout="wide")
 
@@ -566,6 +1141,13 @@ def main():
         .stApp {background-color: #f6f7fb;}
         #MainMenu {visibility: hidden;}
         footer {visibility: hidden;}
+        .wiw-grid {display: grid; grid-template-columns: 1fr 1fr 1.1fr; gap: 1rem;
+                   align-items: start; margin-top: 0.75rem;}
+        @media (max-width: 640px) {.wiw-grid {grid-template-columns: 1fr;}}
+        .wiw-other {background: #ffffff; border: 1px solid #e5e7eb;
+                    border-radius: 0.5rem; padding: 0.5rem 0.75rem;}
+        .wiw-other summary {cursor: pointer; font-size: 0.9rem; color: #374151;}
+        .wiw-other[open] summary {margin-bottom: 0.5rem;}
         </style>
         """,
         unsafe_allow_html=True,
@@ -577,18 +1159,33 @@ def main():
         )
         return
 
-    now_utc = datetime.now(timezone.utc)
-    now_local = datetime.now().astimezone()
-    local_tz_label = (
-        getattr(now_local.tzinfo, "key", None) or now_local.tzname() or "Local time"
-    )
-
     # ----- Header ----- #
-    st.markdown("## Who’s on shift?")
     st.markdown(
+        "## Who’s on shift?\n"
         "<hr style='margin-top:0.1rem; margin-bottom:0.9rem; border: none; height: 2px; background-color: #6366f1;' />",
         unsafe_allow_html=True,
     )
+
+    render_dashboard()
+    render_perf_panel()
+
+
+@st.fragment
+def render_dashboard():
+    """
+    Controls + schedule, as a fragment: changing the location or typing in
+    the search box reruns only this block, not the page chrome above it.
+    """
+    now_utc = datetime.now(timezone.utc)
+
+    # The server's zone doesn't change within a session, so resolve its label once
+    if "tz_label" not in st.session_state:
+        now_local = now_utc.astimezone()
+        st.session_state.tz_label = (
+            getattr(now_local.tzinfo, "key", None) or now_local.tzname() or "Local time"
+        )
+    local_tz_label = st.session_state.tz_label
+
     st.caption(
         f"Current time (UTC): {now_utc.strftime('%Y-%m-%d %H:%M:%S')}  |  Local zone label: {local_tz_label}"
     )
@@ -598,9 +1195,7 @@ def main():
     col_loc, col_search, col_refresh = st.columns([0.32, 0.48, 0.20])
 
     with col_loc:
-        site_options = ["All locations"] + [
-            f"{cfg['flag']} {cfg['label']}" for cfg in ACTIVE_SITES.values()
-        ]
+        site_options = ["All locations", *SITE_LABELS.values()]
         site_choice = st.selectbox("Location", site_options, index=0)
 
     with col_search:
@@ -612,30 +1207,28 @@ def main():
     with col_refresh:
         st.write("")  # vertical spacing
         if st.button("Refresh now", use_container_width=True):
-            st.cache_data.clear()
+            clear_all_caches()
             st.rerun()
 
     st.markdown("")
 
     # ----- Data load ----- #
     try:
-        all_sites = get_active_shifts(now_utc)
+        all_sites, site_errors = get_active_shifts(now_utc)
     except Exception as e:
         st.error(f"Error fetching or parsing schedule: {e}")
         return
 
+    for site_id, e in site_errors.items():
+        st.warning(f"Couldn't load the {ACTIVE_SITES[site_id].label} schedule: {e}")
+
     if not all_sites:
         st.info("No one is currently on shift according to the schedule.")
         return
 
     # Filter by site dropdown
     if site_choice != "All locations":
-        chosen = None
-        for site_id, cfg in ACTIVE_SITES.items():
-            label = f"{cfg['flag']} {cfg['label']}"
-            if label == site_choice:
-                chosen = site_id
-                break
+        chosen = LABEL_TO_SITE_ID.get(site_choice)
         if chosen:
             all_sites = {
                 chosen: all_sites.get(
@@ -643,6 +1236,7 @@ def main():
                     {
                         "meta": ACTIVE_SITES[chosen],
                         "roles": {"MC": [], "Pilot": [], "Other": []},
+                        "mc_roles": group_for_mc_view({}),
                     },
                 )
             }